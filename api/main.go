@@ -57,14 +57,14 @@ func handleAnalyze(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	// Save file to /tmp
-	tmpPath := filepath.Join("/tmp", header.Filename)
-	tmpFile, err := os.Create(tmpPath)
+	// Save file to a unique temp path; the client filename is never used as a path
+	tmpFile, err := os.CreateTemp("", "upload-*"+filepath.Ext(header.Filename))
 	if err != nil {
 		log.Printf("Error creating temp file: %v", err)
 		http.Error(w, "Internal server error", http.StatusInternalServerError)
 		return
 	}
+	tmpPath := tmpFile.Name()
 	defer tmpFile.Close()
 	defer os.Remove(tmpPath) // Clean up after processing
 
@@ -75,7 +75,7 @@ func handleAnalyze(w http.ResponseWriter, r *http.Request) {
 	}
 
 	// Forward file to processor service
-	response, err := forwardToProcessor(tmpPath, header.Filename)
+	response, err := forwardToProcessor(tmpPath, filepath.Base(header.Filename))
 	if err != nil {
 		log.Printf("Error forwarding to processor: %v", err)
 		http.Error(w, "Processing failed", http.StatusInternalServerError)
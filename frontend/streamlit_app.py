@@ -1,6 +1,6 @@
 import streamlit as st
-import requests
-import base64
+import httpx
+import json
 from PIL import Image
 import io
 import time
@@ -17,6 +17,11 @@ st.set_page_config(
 BACKEND_URL = os.getenv('VIDISNAP_BACKEND_URL', 'http://localhost:8000')
 TIMEOUT_SECONDS = int(os.getenv('VIDISNAP_TIMEOUT', '120'))
 
+@st.cache_resource
+def get_client():
+    """Shared HTTP client so keep-alive connections are reused across reruns."""
+    return httpx.Client(base_url=BACKEND_URL, timeout=TIMEOUT_SECONDS)
+
 # Title and description
 st.title("VidiSnap – Quick Demo")
 st.markdown("Upload a video to get AI-powered classification of its first frame.")
@@ -33,32 +38,32 @@ if uploaded_file is not None:
     if st.button("Process Video", type="primary"):
         with st.spinner("Classifying video..."):
             try:
-                # Prepare the file for upload
-                files = {'file': (uploaded_file.name, uploaded_file.getvalue(), 'video/mp4')}
+                # Prepare the file for upload (streamed from the file object, no getvalue() copy)
+                uploaded_file.seek(0)
+                files = {'file': (uploaded_file.name, uploaded_file, 'video/mp4')}
                 
-                # Send request to FastAPI
-                response = requests.post(
-                    f"{BACKEND_URL}/process",
+                # Send request to FastAPI, asking for the raw WebP thumbnail
+                response = get_client().post(
+                    "/process",
                     files=files,
-                    timeout=TIMEOUT_SECONDS
+                    params={'raw': 'true'}
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    labels = json.loads(response.headers.get('X-Labels', '[]'))
                     
                     # Display thumbnail
-                    if result.get('thumbnail_b64'):
-                        thumbnail_data = base64.b64decode(result['thumbnail_b64'])
-                        image = Image.open(io.BytesIO(thumbnail_data))
+                    if response.content:
+                        image = Image.open(io.BytesIO(response.content))
                         st.image(image, caption="First frame", use_container_width=False)
                     
                     # Display labels
-                    if result.get('labels'):
+                    if labels:
                         st.subheader("Top-3 predictions")
                         
                         # Create table data
                         table_data = []
-                        for label_info in result['labels']:
+                        for label_info in labels:
                             label = label_info['label']
                             score = label_info['score'] * 100 
                             table_data.append([label, f"{score:.2f}%"])
@@ -69,9 +74,9 @@ if uploaded_file is not None:
                 else:
                     st.error(f"Processing failed: {response.status_code} - {response.text}")
                     
-            except requests.exceptions.Timeout:
+            except httpx.TimeoutException:
                 st.error("Request timed out. Please try with a smaller video file.")
-            except requests.exceptions.ConnectionError:
+            except httpx.ConnectError:
                 st.error(f"Could not connect to the processing service at {BACKEND_URL}. Make sure it's running and accessible.")
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
@@ -0,0 +1,62 @@
+import os
+import sys
+import logging
+
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import ViTForImageClassification
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger("export_onnx")
+
+MODEL_NAME = "google/vit-base-patch16-224"
+
+class ViTLogits(torch.nn.Module):
+    """Wrap the classifier so tracing sees a plain (logits,) tuple instead of a ModelOutput."""
+    
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+    
+    def forward(self, pixel_values):
+        return (self.model(pixel_values=pixel_values).logits,)
+
+def export_onnx(output_dir="vit_onnx"):
+    """Export the ViT model to ONNX and quantize its weights to INT8."""
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    int8_path = os.path.join(output_dir, "model_int8.onnx")
+    
+    # Export the FP32 graph with a dynamic batch dimension. dynamo=False pins the
+    # TorchScript-based exporter (dynamic_axes/opset_version); newer torch defaults
+    # to the dynamo exporter, which needs onnxscript and dynamic_shapes instead.
+    logger.info(f"Exporting {MODEL_NAME} to {fp32_path}...")
+    model = ViTLogits(ViTForImageClassification.from_pretrained(MODEL_NAME))
+    model.eval()
+    
+    torch.onnx.export(
+        model,
+        (torch.zeros(1, 3, 224, 224),),
+        fp32_path,
+        input_names=["pixel_values"],
+        output_names=["logits"],
+        dynamic_axes={"pixel_values": {0: "batch_size"}, "logits": {0: "batch_size"}},
+        opset_version=17,
+        dynamo=False
+    )
+    
+    # Post-training dynamic quantization of the weights
+    logger.info(f"Quantizing to {int8_path}...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    
+    logger.info("Export complete")
+    return int8_path
+
+def main():
+    """Main function."""
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else "vit_onnx"
+    export_onnx(output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import os
+import sys
+import logging
+
+import torch
+from transformers import ViTForImageClassification
+
+from export_onnx import MODEL_NAME, ViTLogits
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger("export_torchscript")
+
+def export_torchscript(output_dir="vit_ts"):
+    """Trace the ViT model and save it as a TorchScript archive."""
+    os.makedirs(output_dir, exist_ok=True)
+    ts_path = os.path.join(output_dir, "vit_b16.ts")
+    
+    # Tracing requires tuple outputs; the wrapper returns (logits,) on any transformers version
+    logger.info(f"Tracing {MODEL_NAME} to {ts_path}...")
+    model = ViTLogits(ViTForImageClassification.from_pretrained(MODEL_NAME))
+    model.eval()
+    
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.zeros(1, 3, 224, 224))
+    torch.jit.save(traced, ts_path)
+    
+    logger.info("Export complete")
+    return ts_path
+
+def main():
+    """Main function."""
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else "vit_ts"
+    export_torchscript(output_dir)
+
+if __name__ == "__main__":
+    main()
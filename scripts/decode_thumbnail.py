@@ -1,13 +1,13 @@
 import json
-import base64
 import sys
+import pybase64
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger("decode_thumbnail")
 
-def decode_thumbnail(json_file, output_file="thumbnail.jpg"):
+def decode_thumbnail(json_file, output_file="thumbnail.webp"):
     """Decode base64 thumbnail from JSON response."""
     
     try:
@@ -22,7 +22,7 @@ def decode_thumbnail(json_file, output_file="thumbnail.jpg"):
             return False
         
         # Decode base64 to binary
-        thumbnail_data = base64.b64decode(thumbnail_b64)
+        thumbnail_data = pybase64.b64decode(thumbnail_b64, validate=True)
         
         # Save as image file
         with open(output_file, 'wb') as f:
@@ -40,11 +40,11 @@ def main():
     """Main function."""
     if len(sys.argv) < 2:
         logger.info("Usage: python decode_thumbnail.py <json_file> [output_file]")
-        logger.info("Example: python decode_thumbnail.py response.json thumbnail.jpg")
+        logger.info("Example: python decode_thumbnail.py response.json thumbnail.webp")
         return
     
     json_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else "thumbnail.jpg"
+    output_file = sys.argv[2] if len(sys.argv) > 2 else "thumbnail.webp"
     
     decode_thumbnail(json_file, output_file)
 
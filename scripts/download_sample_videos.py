@@ -1,11 +1,40 @@
-import requests
+import httpx
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]"); fall back to HTTP/1.1 without it
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger("download_videos")
 
+CHUNK_SIZE = 1 << 20
+
+def _download(client, filename, url):
+    """Stream a single video to disk."""
+    if os.path.exists(filename):
+        logger.info(f"{filename} already exists")
+        return
+
+    logger.info(f"Downloading {filename} from {url}...")
+    try:
+        with client.stream('GET', url) as response:
+            response.raise_for_status()
+
+            with open(filename, 'wb') as f:
+                for chunk in response.iter_bytes(CHUNK_SIZE):
+                    f.write(chunk)
+
+        logger.info(f"Downloaded {filename}")
+    except Exception as e:
+        logger.error(f"Failed to download {filename}: {e}")
+
 def download_sample_videos():
     """Download sample videos for testing."""
     
@@ -16,22 +45,10 @@ def download_sample_videos():
         "sample_bunny_1mb.mp4":   "https://sample-videos.com/video321/mp4/720/big_buck_bunny_720p_1mb.mp4"
     }
     
-    for filename, url in sample_videos.items():
-        if not os.path.exists(filename):
-            logger.info(f"Downloading {filename} from {url}...")
-            try:
-                response = requests.get(url, stream=True)
-                response.raise_for_status()
-                
-                with open(filename, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                
-                logger.info(f"Downloaded {filename}")
-            except Exception as e:
-                logger.error(f"Failed to download {filename}: {e}")
-        else:
-            logger.info(f"{filename} already exists")
+    # Downloads overlap in threads and share one client (multiplexed over HTTP/2 when h2 is installed)
+    with httpx.Client(http2=HTTP2_AVAILABLE, follow_redirects=True) as client, \
+            ThreadPoolExecutor(max_workers=len(sample_videos)) as pool:
+        list(pool.map(lambda item: _download(client, *item), sample_videos.items()))
 
 if __name__ == "__main__":
     download_sample_videos() 
\ No newline at end of file
@@ -61,7 +61,7 @@ class VidiSnapTester:
                 
                 # Save thumbnail
                 if result.get('thumbnail_b64'):
-                    thumbnail_path = f"thumbnail_{os.path.splitext(os.path.basename(video_path))[0]}.jpg"
+                    thumbnail_path = f"thumbnail_{os.path.splitext(os.path.basename(video_path))[0]}.webp"
                     with open(thumbnail_path, 'wb') as f:
                         f.write(base64.b64decode(result['thumbnail_b64']))
                     logger.info(f"Thumbnail saved: {thumbnail_path}")
@@ -135,6 +135,7 @@ class VidiSnapTester:
         # Test with available video files
         video_files = [
             "test_video.mp4",
+            "sample_small.mp4",  # < 1 MB, stays in the processor's in-memory upload spool
             "sample_bunny_1mb.mp4", 
             "sample_bunny_2mb.mp4",
             "sample_bunny_5mb.mp4"